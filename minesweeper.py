@@ -1,6 +1,9 @@
-import itertools
 import random
 
+# Largest number of cells in a connected group of sentences for which
+# the AI will enumerate every possible placement of mines
+MAX_ENUMERATION_CELLS = 22
+
 
 class Minesweeper():
     """
@@ -14,21 +17,23 @@ class Minesweeper():
         self.width = width
         self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize an empty field with no mines, stored row by row
+        # in a flat buffer indexed by i * width + j
+        self.board = bytearray(height * width)
+
+        # Add mines randomly, drawing all positions in one shot
+        for index in random.sample(range(height * width), mines):
+            i, j = divmod(index, width)
+            self.mines.add((i, j))
+            self.board[index] = 1
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Precompute how many mines neighbour each cell
+        self.counts = bytearray(height * width)
+        for i, j in self.mines:
+            for x in range(max(0, i - 1), min(height, i + 2)):
+                for y in range(max(0, j - 1), min(width, j + 2)):
+                    if (x, y) != (i, j):
+                        self.counts[x * width + y] += 1
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -41,7 +46,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +55,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i * self.width + j])
 
     def nearby_mines(self, cell):
         """
@@ -59,23 +64,8 @@ class Minesweeper():
         not including the cell itself.
         """
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.counts[i * self.width + j]
 
     def won(self):
         """
@@ -89,62 +79,78 @@ class Sentence():
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    The set of cells is stored as a bitboard: an int with one bit
+    set per cell in the sentence.
     """
 
     def __init__(self, cells, count):
-        self.cells = set(cells)
+        self.cells = cells
         self.count = count
+        self.dirty = True # Changed since known_mines/known_safes last checked
 
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash((self.cells, self.count))
+
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{bin(self.cells)} = {self.count}"
 
     def known_mines(self):
         """
-        Returns the set of all cells in self.cells known to be mines.
+        Returns the bitboard of all cells in self.cells known to be mines.
         """
-        mines = set()
         # If the number of mines in a set is the same as length of set,
         # all cells in set must be mines...
-        if len(self.cells) == self.count and self.count != 0:
-            for cell in self.cells:
-                mines.add(cell)
-        
-        return mines # Return set of mines found
+        if self.cells.bit_count() == self.count and self.count != 0:
+            return self.cells
+
+        return 0 # No mines found
 
     def known_safes(self):
         """
-        Returns the set of all cells in self.cells known to be safe.
+        Returns the bitboard of all cells in self.cells known to be safe.
         """
-        safes = set()
         if self.count == 0:
-            for cell in self.cells:
-                safes.add(cell)
-        
-        return safes # Return set of safe squares found
+            return self.cells
 
-    def mark_mine(self, cell):
+        return 0 # No safe squares found
+
+    def mark_mine(self, bit):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be a mine.
+        a cell (given by its bit) is known to be a mine.
         """
         # Check if cell included in sentence
-        if cell in self.cells:
-            self.cells.remove(cell) # Remove cell from sentence
+        if self.cells & bit:
+            self.cells ^= bit # Remove cell from sentence
             self.count -= 1 # This cell was a mine, hence one less in set.
+            self.dirty = True
 
-    def mark_safe(self, cell):
+    def mark_safe(self, bit):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be safe.
+        a cell (given by its bit) is known to be safe.
         """
         # Check if cell included in sentence
-        if cell in self.cells:
-            self.cells.remove(cell) # Remove cell from sentence
+        if self.cells & bit:
+            self.cells ^= bit # Remove cell from sentence
             # count unchanged.
+            self.dirty = True
 
+    def mark_cells(self, safes, mines):
+        """
+        Updates internal knowledge representation given bitboards
+        of cells known to be safe and cells known to be mines.
+        """
+        # Check if any of the cells are included in sentence
+        marked = self.cells & (safes | mines)
+        if marked:
+            self.cells ^= marked # Remove cells from sentence
+            self.count -= (marked & mines).bit_count() # One less per mine removed
+            self.dirty = True
 
 
 class MinesweeperAI():
@@ -165,26 +171,93 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
+        # The same cells as bitboards, for combining with sentences
+        self.mines_mask = 0
+        self.safes_mask = 0
+
+        # Keep track of safe cells that have not been clicked on yet
+        self.safe_moves = set()
+
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Precompute a bitboard of the in-bounds neighbours of every cell
+        self.neighbour_masks = {}
+        for i in range(height):
+            for j in range(width):
+                mask = 0
+                for x in range(max(0, i - 1), min(height, i + 2)):
+                    for y in range(max(0, j - 1), min(width, j + 2)):
+                        if (x, y) != (i, j):
+                            mask |= self.bit((x, y))
+                self.neighbour_masks[(i, j)] = mask
+
+        # Cells a random move may still choose, with each cell's position
+        # in the list so it can be removed in constant time
+        self.candidates = [(i, j) for i in range(height) for j in range(width)]
+        self.candidate_index = {cell: index for index, cell in enumerate(self.candidates)}
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.mark_cells(0, self.bit(cell))
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.add(cell)
+        self.mark_cells(self.bit(cell), 0)
+
+    def mark_cells(self, safes, mines):
+        """
+        Marks every cell in the `safes` bitboard as safe and every cell
+        in the `mines` bitboard as a mine, updating all knowledge
+        in a single pass over the sentences.
+        """
+        for cell in self.cells(safes):
+            self.safes.add(cell)
+            if cell not in self.moves_made:
+                self.safe_moves.add(cell)
+        for cell in self.cells(mines):
+            self.mines.add(cell)
+            self.remove_candidate(cell)
+
+        self.safes_mask |= safes
+        self.mines_mask |= mines
         for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+            sentence.mark_cells(safes, mines)
+
+    def remove_candidate(self, cell):
+        """
+        Removes a cell from the random move candidates, if present,
+        by swapping the last candidate into its place.
+        """
+        index = self.candidate_index.pop(cell, None)
+        if index is None:
+            return
+        last = self.candidates.pop()
+        if last != cell:
+            self.candidates[index] = last
+            self.candidate_index[last] = index
+
+    def bit(self, cell):
+        """
+        Returns the bitboard bit representing a cell.
+        """
+        i, j = cell
+        return 1 << (i * self.width + j)
+
+    def cells(self, mask):
+        """
+        Yields the cells whose bits are set in a bitboard.
+        """
+        while mask:
+            low = mask & -mask # Isolate lowest set bit
+            yield divmod(low.bit_length() - 1, self.width)
+            mask ^= low
 
     def add_knowledge(self, cell, count):
         """
@@ -203,6 +276,8 @@ class MinesweeperAI():
         """
 
         self.moves_made.add(cell) # Mark the cell as a move that's been made
+        self.remove_candidate(cell)
+        self.safe_moves.discard(cell)
 
         self.mark_safe(cell) # Mark the cell as safe
 
@@ -211,17 +286,10 @@ class MinesweeperAI():
         based on the value of cell and count, to indicate that count of the cell’s neighbors are mines.
         Be sure to only include cells whose state is still undetermined in the sentence.
         """
-        unexplored_neighbours = set()
-        mine_count = 0
-        # Loop over all cells within one row and column of cell
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-                if (i, j) in self.mines:
-                    mine_count += 1
-                # Confirm neighbouring cell is still undetermined
-                if ((0 <= i < self.height) and (0 <= j < self.width)):
-                    if (i,j) not in self.safes and (i,j) not in self.mines:
-                        unexplored_neighbours.add((i,j))
+        neighbours = self.neighbour_masks[cell]
+        mine_count = (neighbours & self.mines_mask).bit_count()
+        # Keep only neighbouring cells that are still undetermined
+        unexplored_neighbours = neighbours & ~(self.mines_mask | self.safes_mask)
 
         # Add sentence to knowledge base.
         new_sentence = Sentence(unexplored_neighbours, count - mine_count)
@@ -232,36 +300,189 @@ class MinesweeperAI():
         """
         
         while True:
-            new_safes = set()
-            new_mines = set()
+            new_safes = 0
+            new_mines = 0
 
+            # Only sentences changed since the last check can reveal anything new
             for sentence in self.knowledge:
-                new_safes.update(sentence.known_safes())
-                new_mines.update(sentence.known_mines())
-
-            if not new_safes and not new_mines:
-                break
-
-            for safe in new_safes:
-                self.mark_safe(safe)
-            for mine in new_mines:
-                self.mark_mine(mine)
+                if sentence.dirty:
+                    sentence.dirty = False
+                    new_safes |= sentence.known_safes()
+                    new_mines |= sentence.known_mines()
+
+            self.mark_cells(new_safes, new_mines)
+
+            # Drop sentences that are empty (including every sentence that
+            # was fully determined, as its cells have just been marked)
+            # or duplicated, so they aren't reprocessed every round
+            known = set()
+            knowledge = []
+            for sentence in self.knowledge:
+                key = (sentence.cells, sentence.count)
+                if sentence.cells and key not in known:
+                    known.add(key)
+                    knowledge.append(sentence)
+            self.knowledge = knowledge
 
             """
             5) If, based on any of the sentences in self.knowledge, 
             new sentences can be inferred (using the subset method described in the Background), 
             then those sentences should be added to the knowledge base as well.
             """
+            # Sentences sharing no cells can't be subsets of each other,
+            # so infer within each connected group of sentences separately
             new_knowledge = []
-            for sentence1 in self.knowledge:
-                for sentence2 in self.knowledge:
-                    if sentence1 != sentence2 and sentence2.cells.issubset(sentence1.cells):
-                        inferred_sentence = Sentence((sentence1.cells - sentence2.cells), (sentence1.count - sentence2.count))
-                        if inferred_sentence not in self.knowledge:
-                            new_knowledge.append(inferred_sentence)
-            
-            for item in new_knowledge:
-                self.knowledge.append(item)
+            for component in self.components():
+                new_knowledge.extend(self.infer_subsets(component, known))
+
+            self.knowledge.extend(new_knowledge)
+
+            if new_safes or new_mines or new_knowledge:
+                continue
+
+            """
+            6) The subset method can't find every conclusion, so once it stalls,
+            check every possible placement of mines in each small group of
+            connected sentences for cells that are safe or mines in all of them.
+            """
+            for component in self.components():
+                safes, mines = self.enumerate_component(component)
+                new_safes |= safes
+                new_mines |= mines
+
+            # Stop once a round teaches us nothing new
+            if not new_safes and not new_mines:
+                break
+
+            self.mark_cells(new_safes, new_mines)
+
+    def components(self):
+        """
+        Splits the knowledge base into groups of sentences
+        that are connected to each other by shared cells.
+        """
+        parent = list(range(len(self.knowledge)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        # Union every sentence with the first sentence seen for each cell
+        owner = {}
+        for index, sentence in enumerate(self.knowledge):
+            mask = sentence.cells
+            while mask:
+                low = mask & -mask
+                if low in owner:
+                    parent[find(index)] = find(owner[low])
+                else:
+                    owner[low] = index
+                mask ^= low
+
+        groups = {}
+        for index, sentence in enumerate(self.knowledge):
+            groups.setdefault(find(index), []).append(sentence)
+        return list(groups.values())
+
+    def infer_subsets(self, sentences, known):
+        """
+        Returns the new sentences implied by the subset method
+        for the given sentences, skipping (cells, count) pairs
+        already in `known`, which is updated with the new ones.
+        """
+        # Index sentences by each of their cells, so a subset is only
+        # compared against sentences sharing at least one of its cells
+        by_bit = {}
+        for sentence in sentences:
+            mask = sentence.cells
+            while mask:
+                low = mask & -mask
+                by_bit.setdefault(low, []).append(sentence)
+                mask ^= low
+
+        inferred = []
+        for sentence2 in sentences:
+            # Any superset must contain sentence2's lowest cell
+            for sentence1 in by_bit[sentence2.cells & -sentence2.cells]:
+                # Sentences are deduplicated, so equal cells means the same sentence
+                if (sentence1 is not sentence2
+                        and sentence1.cells & sentence2.cells == sentence2.cells):
+                    inferred_sentence = Sentence((sentence1.cells & ~sentence2.cells), (sentence1.count - sentence2.count))
+                    key = (inferred_sentence.cells, inferred_sentence.count)
+                    if key not in known:
+                        known.add(key)
+                        inferred.append(inferred_sentence)
+
+        return inferred
+
+    def enumerate_component(self, sentences):
+        """
+        Searches every placement of mines consistent with a connected
+        group of sentences, and returns bitboards of the cells that are
+        safe in all placements and of those that are mines in all of them.
+
+        Groups covering more than MAX_ENUMERATION_CELLS cells are skipped.
+        """
+        cells = 0
+        for sentence in sentences:
+            cells |= sentence.cells
+        if cells.bit_count() > MAX_ENUMERATION_CELLS:
+            return 0, 0
+
+        bits = []
+        mask = cells
+        while mask:
+            low = mask & -mask
+            bits.append(low)
+            mask ^= low
+
+        # For each sentence, the mines still to place and cells left to assign
+        needed = [sentence.count for sentence in sentences]
+        remaining = [sentence.cells.bit_count() for sentence in sentences]
+        containing = [
+            [index for index, sentence in enumerate(sentences) if sentence.cells & bit]
+            for bit in bits
+        ]
+
+        # Union of the mines, and of the safe cells, over all placements found
+        ever_mine = 0
+        ever_safe = 0
+        found = False
+
+        def search(depth, mines):
+            nonlocal ever_mine, ever_safe, found
+            if depth == len(bits):
+                found = True
+                ever_mine |= mines
+                ever_safe |= cells & ~mines
+                # Stop early once no cell can be determined
+                return ever_mine == cells and ever_safe == cells
+
+            bit = bits[depth]
+            for is_mine in (True, False):
+                consistent = True
+                for index in containing[depth]:
+                    remaining[index] -= 1
+                    needed[index] -= is_mine
+                    if not 0 <= needed[index] <= remaining[index]:
+                        consistent = False
+
+                done = consistent and search(depth + 1, mines | bit if is_mine else mines)
+
+                for index in containing[depth]:
+                    remaining[index] += 1
+                    needed[index] += is_mine
+                if done:
+                    return True
+
+            return False
+
+        search(0, 0)
+        if not found:
+            return 0, 0
+        return cells & ~ever_mine, cells & ~ever_safe
 
     def make_safe_move(self):   
         """
@@ -272,15 +493,8 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for cell in self.safes:
-            # Confirm move not yet made
-            if cell in self.moves_made:
-                continue
-            else:
-                return cell
-            
         # If all known safe moves have been made, return None
-        return None
+        return next(iter(self.safe_moves), None)
 
     def make_random_move(self):
         """
@@ -289,16 +503,8 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        # Initialise array for potential moves
-        possibleMoves = []
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i,j) not in self.mines and (i,j) not in self.moves_made:
-                    possibleMoves.append((i,j))
-            
         # If no possible moves, return None
-        if len(possibleMoves) == 0:
+        if not self.candidates:
             return None
         else:
-            return random.choice(possibleMoves)
-    
\ No newline at end of file
+            return random.choice(self.candidates)